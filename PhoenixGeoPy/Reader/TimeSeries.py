@@ -6,13 +6,76 @@ and native sampling rate time series formats of the MTU-5C family.
 
 __author__ = 'Jorge Torres-Solis'
 
-from numpy import empty, fromfile, float32, append
-from struct import unpack_from, unpack
+from numpy import diff, dtype, empty, flatnonzero, float32, int32, int64, uint8, uint32, frombuffer, multiply, zeros_like
+from collections import namedtuple
+from struct import Struct
+import logging
+import mmap
 import os
-import string
-from cmath import phase
 from PhoenixGeoPy.Reader.DataScaling import DataScaling
 
+_logger = logging.getLogger(__name__)
+
+# Layout of a native sampling rate frame: 20 big-endian 24-bit samples and a 4-byte footer
+_NATIVE_FRAME = dtype([('samples', uint8, (20, 3)), ('footer', '<u4')])
+# Native frame footer fields, as uint32 so that masking the footers keeps their dtype
+_FOOTER_IDX_SAMP_MASK = uint32(0x0FFFFFFF)
+_FOOTER_SAT_MASK = uint32(0x70000000)
+
+# Little-endian layout of the fixed fields of the 128-byte file header (byte 96 is unused)
+_HEADER = Struct('<BBH8s8sIBIH8s8sI8BHbBIHHfffIIBBHbxiHHHff')
+
+# pow(10, exp) for the sample rate exponents in use, positive ones kept as int like pow() does
+_POWERS_OF_10 = {-3: 0.001, -2: 0.01, -1: 0.1, 1: 10, 2: 100, 3: 1000}
+# Boards with the original gain banks (original style 24 KSps and 96 KSps boards)
+_ORIGINAL_GAIN_BOARD_MODELS = frozenset(("BCM01", "BCM03"))
+# Boards whose LPF settings have the higher cutoff frequencies
+_LPF_HIGH_RANGE_BOARD_MODELS = frozenset(("BCM03", "BCM06"))
+# Nominal LPF cutoff in Hz by (LPF on bit and LPF selection of config_fp[0], high range board)
+_LPF_HZ = {(0x83, False): 10, (0x83, True): 10,
+           (0x82, False): 100, (0x82, True): 1000,
+           (0x81, False): 1000, (0x81, True): 10000,
+           (0x00, False): 10000, (0x00, True): 17800}   # LPF off
+# Main gain by (gain selection of config_fp[0], board has the new gain banks)
+_MAIN_GAIN = {(0x00, False): 1.0, (0x00, True): 1.0,
+              (0x04, False): 4.0, (0x04, True): 4.0,
+              (0x08, False): 16.0, (0x08, True): 6.0,
+              (0x0C, False): 32.0, (0x0C, True): 8.0}
+
+# Samples of decimated files are little endian floats, which are read as is into arrays of this type
+_DECIMATED_SAMPLE = dtype('<f4')
+
+# Bytes at the start of the next file of a sequence to have the kernel read ahead of time
+_PREFETCH_BYTES = 4 << 20
+
+# Fields at the start of the 32-byte subheader of each record of segmented decimated files
+_SEGMENT_SUBHEADER = Struct('<IIHHfff')
+
+# Subheader of a record of segmented decimated files, as read by DecimatedSegmentedReader.read_subheader.
+# The fields are attributes (subheader.samplesInRecord); subheader._asdict() gives them as a dict
+SegmentSubheader = namedtuple('SegmentSubheader', ('timestamp', 'samplesInRecord', 'satCount', 'missCount',
+                                                   'minVal', 'maxVal', 'avgVal'))
+_EMPTY_SEGMENT_SUBHEADER = SegmentSubheader(0, 0, 0, 0, 0.0, 0.0, 0.0)
+
+
+def _decode_native_samples(sample_bytes, scale_factor, out, scratch):
+    """Decode packed big-endian 24-bit samples into the float array out, applying scale_factor
+
+    The 3 sample bytes are placed at the top of an int32, which keeps the sign bit where the
+    scale factors expect it (full scale is 2 ** 31). scratch is an int32 work array that must
+    hold at least as many samples as out"""
+    sample_bytes = sample_bytes.reshape(-1, 3)
+    samples = scratch[:len(sample_bytes)]
+    samples[:] = sample_bytes[:, 0]
+    samples <<= 8
+    samples |= sample_bytes[:, 1]
+    samples <<= 8
+    samples |= sample_bytes[:, 2]
+    samples <<= 8
+    # Multiply in the precision of out rather than promoting to float64 first. Converting the samples
+    # to float32 is exact, since they only have 24 significant bits
+    multiply(samples, scale_factor, out=out, dtype=out.dtype)
+
 
 class _TSReaderBase(object):
     def __init__(self, path, num_files=1, header_size=128, report_hw_sat=False):
@@ -25,8 +88,12 @@ class _TSReaderBase(object):
         self.ch_id = file_parts[2]
         seq_str = file_parts[3]
         self.seq = int(seq_str, base=16)
+        # Every file in the sequence only differs by its hex sequence number
+        self.__seq_path_prefix = os.path.join(self.base_dir, "%s_%s_%s_" % (self.inst_id, self.rec_id, self.ch_id))
         self.last_seq = self.seq + num_files
         self.stream = None
+        self.data_map = None  # Read-only memory map of the file currently streamed
+        self.file_size = 0    # Size in bytes of the file currently streamed
         self.report_hw_sat = report_hw_sat
         self.header_info = {}
         self.header_size = header_size
@@ -44,40 +111,71 @@ class _TSReaderBase(object):
 
     def open_next(self):
         ret_val = False
-        if self.stream is not None:
-            self.stream.close()
+        self.close()
         self.seq += 1
         if self.seq < self.last_seq:
-            new_seq_str = "%08X" % (self.seq)
-            new_path = (self.base_dir + '/' + self.inst_id + '_' +
-                        self.rec_id + '_' + self.ch_id + '_' +
-                        new_seq_str + '.' + self.file_extension)
+            new_path = self.__seq_path(self.seq)
             if os.path.exists(new_path):
-                self.stream = open(new_path, 'rb')
-                if self.header_size > 0:
-                    self.dataHeader = self.stream.read(self.header_size)
+                self.__open_stream(new_path)
                 ret_val = True
 
         return ret_val
 
     def open_file_seq(self, file_seq_num):
         ret_val = False
-        if self.stream is not None:
-            self.stream.close()
+        self.close()
         self.seq = file_seq_num
-        new_seq_str = "%08X" % (self.seq)
-        new_path = (self.base_dir + '/' + self.inst_id + '_' +
-                    self.rec_id + '_' + self.ch_id + '_' +
-                    new_seq_str + '.' + self.file_extension)
+        new_path = self.__seq_path(self.seq)
         if os.path.exists(new_path):
-            print (" opening " + new_path)
-            self.stream = open(new_path, 'rb')
-            if self.header_size > 0:
-                self.dataHeader = self.stream.read(self.header_size)
+            _logger.debug("opening %s", new_path)
+            self.__open_stream(new_path)
             ret_val = True
 
         return ret_val
 
+    def __seq_path(self, seq):
+        return "%s%08X.%s" % (self.__seq_path_prefix, seq, self.file_extension)
+
+    def __open_stream(self, path):
+        self.stream = open(path, 'rb')
+        self.file_size = os.fstat(self.stream.fileno()).st_size
+        # The files are read front to back, let the kernel read ahead more aggressively, both for the
+        # stream and for the pages of the map
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(self.stream.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        # Map the file as well, so that bulk readers can view the data without copying it
+        self.data_map = None
+        if self.file_size > 0:
+            file_map = mmap.mmap(self.stream.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                try:
+                    file_map.madvise(mmap.MADV_SEQUENTIAL)
+                except OSError:
+                    pass
+            self.data_map = frombuffer(file_map, dtype=uint8)
+        if self.header_size > 0:
+            self.dataHeader = self.stream.read(self.header_size)
+        self.__prefetch_seq(self.seq + 1)
+
+    def __prefetch_seq(self, seq):
+        # Ask the kernel to start reading the beginning of the next file of the sequence in the
+        # background, so that crossing into it does not stall on the disk
+        if not hasattr(os, 'posix_fadvise') or seq >= self.last_seq:
+            return
+        try:
+            fd = os.open(self.__seq_path(seq), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.posix_fadvise(fd, 0, _PREFETCH_BYTES, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
     def __populate_channel_type(self, config_fp):
         if config_fp[1] & 0x08 == 0x08:
             self.channel_type = "E"
@@ -91,24 +189,17 @@ class _TSReaderBase(object):
             self.detected_channel_type = 'H'
 
     def __populate_lpf(self, config_fp):
-        if config_fp[0] & 0x80 == 0x80:            # LPF on
-            if config_fp[0] & 0x03 == 0x03:
-                self.lpf_Hz = 10
-            elif config_fp[0] & 0x03 == 0x02:
-                if (self.board_model_main == "BCM03" or self.board_model_main == "BCM06"):
-                    self.lpf_Hz = 1000
-                else:
-                    self.lpf_Hz = 100
-            elif config_fp[0] & 0x03 == 0x01:
-                if (self.board_model_main == "BCM03" or self.board_model_main == "BCM06"):
-                    self.lpf_Hz = 10000
-                else:
-                    self.lpf_Hz = 1000
-        else:                                      # LPF off
-            if (self.board_model_main == "BCM03" or self.board_model_main == "BCM06"):
-                self.lpf_Hz = 17800
-            else:
-                self.lpf_Hz = 10000
+        lpf_bits = config_fp[0] & 0x83
+        if not lpf_bits & 0x80:   # LPF off, the filter selection does not matter
+            lpf_bits = 0x00
+        key = (lpf_bits, self.board_model_main in _LPF_HIGH_RANGE_BOARD_MODELS)
+        self.lpf_Hz = _LPF_HZ.get(key, self.lpf_Hz)
+
+    def __has_original_gain_banks(self):
+        # Original style 24 KSps boards and original 96 KSps boards, and the
+        # experimental prototype BCM05-A, which also had original gain banks
+        return (self.board_model_main in _ORIGINAL_GAIN_BOARD_MODELS
+                or self.header_info['ch_hwv'][0:7] == "BCM05-A")
 
     def __popuate_peamp_gain(self, config_fp):
         if self.channel_type == "?":
@@ -117,7 +208,7 @@ class _TSReaderBase(object):
         self.preamp_gain = 1.0
         if self.channel_type == "E":
             if preamp_on is True:
-                if self.board_model_main == "BCM01" or self.board_model_main == "BCM03":
+                if self.board_model_main in _ORIGINAL_GAIN_BOARD_MODELS:
                     self.preamp_gain = 4.0
                     if (self.board_model_revision == "L"):
                         #Account for BCM01-L experimental prototype
@@ -127,28 +218,12 @@ class _TSReaderBase(object):
                     # Acount for experimental prototype BCM05-A
                     if self.header_info['ch_hwv'][0:7] == "BCM05-A":
                         self.preamp_gain = 4.0
-    
+
     def __populate_main_gain(self, config_fp):
-        # BCM05-B and BCM06 introduced different selectable gains
-        new_gains = True   # we asume any newer board will have the new gain banks
-        if self.board_model_main == "BCM01" or self.board_model_main == "BCM03":
-            # Original style 24 KSps boards and original 96 KSps boards
-            new_gains = False
-        if self.header_info['ch_hwv'][0:7] == "BCM05-A":
-            # Acount for experimental prototype BCM05-A, which also had original gain banks
-            new_gains = False
-        if config_fp[0] & 0x0C == 0x00:
-            self.channel_main_gain = 1.0
-        elif config_fp[0] & 0x0C == 0x04:
-            self.channel_main_gain = 4.0
-        elif config_fp[0] & 0x0C == 0x08:
-            self.channel_main_gain = 6.0
-            if not new_gains:
-                self.channel_main_gain = 16.0
-        elif config_fp[0] & 0x0C == 0x0C:
-            self.channel_main_gain = 8.0
-            if not new_gains:
-                self.channel_main_gain = 32.0
+        # BCM05-B and BCM06 introduced different selectable gains, we asume any
+        # newer board will have the new gain banks
+        new_gains = not self.__has_original_gain_banks()
+        self.channel_main_gain = _MAIN_GAIN[(config_fp[0] & 0x0C, new_gains)]
 
     def __handle_sensor_range(self, config_fp):
         """This function will adjust the intrinsic circuitry gain based on the
@@ -175,40 +250,42 @@ class _TSReaderBase(object):
             raise Exception("Channel type must be set before attemting to calculate preamp gain")
         attenuator_on = bool(config_fp[4] & 0x01)
         if attenuator_on and self.channel_type == "E":
-            new_attenuator = True  # By default assume that we are dealing with a newer types of boards
-            if self.board_model_main == "BCM01" or self.board_model_main == "BCM03":
-                # Original style 24 KSps boards and original 96 KSps boards
-                new_attenuator = False
-            if self.header_info['ch_hwv'][0:7] == "BCM05-A":
-                # Acount for experimental prototype BCM05-A, which also had original gain banks
-                new_attenuator = False
-
+            # By default assume that we are dealing with a newer types of boards
+            new_attenuator = not self.__has_original_gain_banks()
             if new_attenuator:
                 self.attenuator_gain = 523.0 / 5223.0
             else:
                 self.attenuator_gain = 0.1
 
     def unpack_header(self):
-        self.header_info['file_type'] = unpack_from('B', self.dataHeader, 0)[0]
-        self.header_info['file_version'] = unpack_from('B', self.dataHeader, 1)[0]
-        self.header_info['length'] = unpack_from('H', self.dataHeader, 2)[0]
-        self.header_info['inst_type'] = unpack_from('8s', self.dataHeader, 4)[0].decode("utf-8").strip(' ').strip('\x00')
-        self.header_info['inst_serial'] = b''.join(unpack_from('cccccccc', self.dataHeader, 12)).strip(b'\x00')
-        self.header_info['rec_id'] = unpack_from('I', self.dataHeader, 20)[0]
-        self.header_info['ch_id'] = unpack_from('B', self.dataHeader, 24)[0]
-        self.header_info['file_sequence'] = unpack_from('I', self.dataHeader, 25)[0]
-        self.header_info['frag_period'] = unpack_from('H', self.dataHeader, 29)[0]
-        self.header_info['ch_hwv'] = unpack_from('8s', self.dataHeader, 31)[0].decode("utf-8").strip(' ')
+        fields = _HEADER.unpack_from(self.dataHeader, 0)
+        (file_type, file_version, length, inst_type, inst_serial, rec_id, ch_id, file_sequence,
+         frag_period, ch_hwv, ch_ser, ch_fir) = fields[0:12]
+        config_fp = fields[12:20]
+        (sample_rate_base, sample_rate_exp, bytes_per_sample, frame_size, decimation_node_id,
+         frame_rollover_count, gps_long, gps_lat, gps_height, gps_hacc, gps_vacc,
+         timing_flags, timing_sat_count, timing_stability, future1, future2, saturated_frames,
+         missing_frames, battery_voltage_mV, min_signal, max_signal) = fields[20:]
+
+        self.header_info['file_type'] = file_type
+        self.header_info['file_version'] = file_version
+        self.header_info['length'] = length
+        self.header_info['inst_type'] = inst_type.decode("utf-8").strip(' ').strip('\x00')
+        self.header_info['inst_serial'] = inst_serial.strip(b'\x00')
+        self.header_info['rec_id'] = rec_id
+        self.header_info['ch_id'] = ch_id
+        self.header_info['file_sequence'] = file_sequence
+        self.header_info['frag_period'] = frag_period
+        self.header_info['ch_hwv'] = ch_hwv.decode("utf-8").strip(' ')
         self.board_model_main = self.header_info['ch_hwv'][0:5]
-        self.board_model_revision = self.header_info['ch_hwv'][6:1]
-        self.header_info['ch_ser'] = unpack_from('8s', self.dataHeader, 39)[0].decode("utf-8").strip('\x00')
+        self.board_model_revision = self.header_info['ch_hwv'][6:7]
+        ch_ser = ch_ser.strip(b'\x00')
         # handle the case of backend < v0.14, which puts '--------' in ch_ser
-        if all(chars in string.hexdigits for chars in self.header_info['ch_ser']):
-            self.header_info['ch_ser'] = int(self.header_info['ch_ser'], 16)
-        else:
+        try:
+            self.header_info['ch_ser'] = int(ch_ser, 16)
+        except ValueError:
             self.header_info['ch_ser'] = 0
-        self.header_info['ch_fir'] = hex(unpack_from('I', self.dataHeader, 47)[0])
-        config_fp = unpack_from('BBBBBBBB', self.dataHeader, 51)
+        self.header_info['ch_fir'] = hex(ch_fir)
         self.header_info['conf_fp'] = config_fp
         # Channel type
         self.__populate_channel_type(config_fp)
@@ -226,40 +303,57 @@ class _TSReaderBase(object):
         self.total_selectable_gain = self.channel_main_gain * self.preamp_gain * self.attenuator_gain
         self.total_circuitry_gain = self.total_selectable_gain * self.intrinsic_circuitry_gain
 
-        self.header_info['sample_rate_base'] = unpack_from('H', self.dataHeader, 59)[0]
-        self.header_info['sample_rate_exp'] = unpack_from('b', self.dataHeader, 61)[0]
+        self.header_info['sample_rate_base'] = sample_rate_base
+        self.header_info['sample_rate_exp'] = sample_rate_exp
         self.header_info['sample_rate'] = self.header_info['sample_rate_base']
-        if self.header_info['sample_rate_exp'] != 0:
-            self.header_info['sample_rate'] *= pow(10, self.header_info['sample_rate_exp'])
-        self.header_info['bytes_per_sample'] = unpack_from('B', self.dataHeader, 62)[0]
-        self.header_info['frame_size'] = unpack_from('I', self.dataHeader, 63)[0]
+        if sample_rate_exp != 0:
+            self.header_info['sample_rate'] *= _POWERS_OF_10.get(sample_rate_exp) or pow(10, sample_rate_exp)
+        self.header_info['bytes_per_sample'] = bytes_per_sample
+        self.header_info['frame_size'] = frame_size
         self.dataFooter = self.header_info['frame_size'] >> 24
         self.frameSize = self.header_info['frame_size'] & 0x0ffffff
-        self.header_info['decimation_node_id'] = unpack_from('H', self.dataHeader, 67)[0]
-        self.header_info['frame_rollover_count'] = unpack_from('H', self.dataHeader, 69)[0]
-        self.header_info['gps_long'] = unpack_from('f', self.dataHeader, 71)[0]
-        self.header_info['gps_lat'] = unpack_from('f', self.dataHeader, 75)[0]
-        self.header_info['gps_height'] = unpack_from('f', self.dataHeader, 79)[0]
-        self.header_info['gps_hacc'] = unpack_from('I', self.dataHeader, 83)[0]
-        self.header_info['gps_vacc'] = unpack_from('I', self.dataHeader, 87)[0]
-        self.header_info['timing_status'] = unpack_from('BBH', self.dataHeader, 91)
-        self.header_info['timing_flags'] = self.header_info['timing_status'][0]
-        self.header_info['timing_sat_count'] = self.header_info['timing_status'][1]
-        self.header_info['timing_stability'] = self.header_info['timing_status'][2]
-        self.header_info['future1'] = unpack_from('b', self.dataHeader, 95)[0]
-        self.header_info['future2'] = unpack_from('i', self.dataHeader, 97)[0]
-        self.header_info['saturated_frames'] = unpack_from('H', self.dataHeader, 101)[0]
-        if self.header_info['saturated_frames'] & 0x80 == 0x80:
-            self.header_info['saturated_frames'] &= 0x7F
-            self.header_info['saturated_frames'] <<= 4
-        self.header_info['missing_frames'] = unpack_from('H', self.dataHeader, 103)[0]
-        self.header_info['battery_voltage_mV'] = unpack_from('H', self.dataHeader, 105)[0]
-        self.header_info['min_signal'] = unpack_from('f', self.dataHeader, 107)[0]
-        self.header_info['max_signal'] = unpack_from('f', self.dataHeader, 111)[0]
+        self.header_info['decimation_node_id'] = decimation_node_id
+        self.header_info['frame_rollover_count'] = frame_rollover_count
+        self.header_info['gps_long'] = gps_long
+        self.header_info['gps_lat'] = gps_lat
+        self.header_info['gps_height'] = gps_height
+        self.header_info['gps_hacc'] = gps_hacc
+        self.header_info['gps_vacc'] = gps_vacc
+        self.header_info['timing_status'] = (timing_flags, timing_sat_count, timing_stability)
+        self.header_info['timing_flags'] = timing_flags
+        self.header_info['timing_sat_count'] = timing_sat_count
+        self.header_info['timing_stability'] = timing_stability
+        self.header_info['future1'] = future1
+        self.header_info['future2'] = future2
+        # saturated_frames is a 16-bit count, whose top bit flags that the count is in units of 16 frames
+        if saturated_frames & 0x8000 == 0x8000:
+            saturated_frames = (saturated_frames & 0x7FFF) << 4
+        self.header_info['saturated_frames'] = saturated_frames
+        self.header_info['missing_frames'] = missing_frames
+        self.header_info['battery_voltage_mV'] = battery_voltage_mV
+        self.header_info['min_signal'] = min_signal
+        self.header_info['max_signal'] = max_signal
+
+    def _view_samples(self, num_samples, sample_dtype):
+        """Return the next num_samples samples of the current file as a read-only view into its
+        memory map, advancing the stream past them. Returns None if the file does not hold them all"""
+        num_bytes = num_samples * sample_dtype.itemsize
+        offset = self.stream.tell()
+        if self.data_map is None or offset + num_bytes > self.file_size:
+            return None
+        self.stream.seek(num_bytes, os.SEEK_CUR)
+        return self.data_map[offset:offset + num_bytes].view(sample_dtype)
 
     def close(self):
         if self.stream is not None:
             self.stream.close()
+        self.data_map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 class NativeReader(_TSReaderBase):
     """Native sampling rate 'Raw' time series reader class"""
@@ -272,7 +366,6 @@ class NativeReader(_TSReaderBase):
 
         # Track the last frame seen by the streamer, to report missing frames
         self.last_frame = last_frame
-        self.header_size = header_size
         self.data_scaling = scale_to
         self.total_circuitry_gain = channel_gain
         self.ad_plus_minus_range = ad_plus_minus_range
@@ -285,7 +378,7 @@ class NativeReader(_TSReaderBase):
         self.input_plusminus_range = self.ad_plus_minus_range / self.total_circuitry_gain
 
         if self.data_scaling == DataScaling.AD_in_ADunits:
-            self._scale_factor = 256
+            self._scale_factor = 256.0
         elif self.data_scaling == DataScaling.AD_input_volts:
             self._scale_factor = self.ad_plus_minus_range / (2 ** 31)
         elif self.data_scaling == DataScaling.instrument_input_volts:
@@ -294,8 +387,9 @@ class NativeReader(_TSReaderBase):
             raise LookupError("Invalid scaling requested")
 
         # optimization variables
-        self.footer_idx_samp_mask = int('0x0fffffff', 16)
-        self.footer_sat_mask = int('0x70000000', 16)
+        self.footer_idx_samp_mask = _FOOTER_IDX_SAMP_MASK
+        self.footer_sat_mask = _FOOTER_SAT_MASK
+        self._decode_scratch = empty([0], dtype=int32)  # Reused by read_frames for batches that fit, grown for larger ones
 
     def unpack_header(self):
         super(NativeReader, self).unpack_header()
@@ -303,62 +397,80 @@ class NativeReader(_TSReaderBase):
 
     def read_frames(self, num_frames):
         frames_in_buf = 0
-        _idx_buf = 0
-        _data_buf = empty([num_frames * 20])  # 20 samples packed in a frame
+        _data_buf = empty([num_frames * 20], dtype=float32)  # 20 samples packed in a frame
+        # Attributes that stay constant while streaming, bound once to locals
+        ch_id = self.ch_id
+        scale_factor = self._scale_factor
+        footer_idx_samp_mask = self.footer_idx_samp_mask
+        footer_sat_mask = self.footer_sat_mask
+        report_hw_sat = self.report_hw_sat
 
         while (frames_in_buf < num_frames):
 
-            dataFrame = self.stream.read(64)
-            if not dataFrame:
+            # View as many of the pending frames as possible straight from the file map
+            offset = self.stream.tell()
+            frames_read = 0
+            if self.data_map is not None:
+                frames_read = min(num_frames - frames_in_buf, (self.data_map.size - offset) // 64)
+            if frames_read <= 0:
                 if not self.open_next():
-                    return empty([0])
-                dataFrame = self.stream.read(64)
-                if not dataFrame:
-                    return empty([0])
+                    return empty([0], dtype=float32)
+                continue
+            dataFrames = self.data_map[offset:offset + frames_read * 64]
+            self.stream.seek(offset + frames_read * 64)
 
-            dataFooter = unpack_from("I", dataFrame, 60)
+            frames = dataFrames.view(_NATIVE_FRAME)
+            footers = frames['footer']
 
             # Check that there are no skipped frames
-            frameCount = dataFooter[0] & self.footer_idx_samp_mask
-            difCount = frameCount - self.last_frame
-            if (difCount != 1):
-                print ("Ch [%s] Missing frames at %d [%d]\n" %
-                       (self.ch_id, frameCount, difCount))
-            self.last_frame = frameCount
-
-            for ptrSamp in range(0, 60, 3):
-                tmpSampleTupple = unpack(">i", dataFrame[ptrSamp:ptrSamp + 3] + b'\x00')
-                _data_buf[_idx_buf] = tmpSampleTupple[0] * self._scale_factor
-                _idx_buf += 1
-
-            frames_in_buf += 1
-
-            if self.report_hw_sat:
-                satCount = (dataFooter[0] & self.footer_sat_mask) >> 24
-                if satCount:
-                    print ("Ch [%s] Frame %d has %d saturations" %
-                           (self.ch_id, frameCount, satCount))
+            frame_counts = footers & footer_idx_samp_mask
+            dif_counts = diff(frame_counts.astype(int64), prepend=self.last_frame)
+            self.last_frame = int(frame_counts[-1])
+            sat_counts = (footers & footer_sat_mask) >> 24 if report_hw_sat else zeros_like(footers)
+
+            # Report only the flagged frames, in the order they were streamed, as a single log record
+            flagged = flatnonzero((dif_counts != 1) | (sat_counts != 0))
+            if flagged.size:
+                messages = []
+                for frameCount, difCount, satCount in zip(frame_counts[flagged].tolist(),
+                                                          dif_counts[flagged].tolist(),
+                                                          sat_counts[flagged].tolist()):
+                    if (difCount != 1):
+                        messages.append("Ch [%s] Missing frames at %d [%d]" %
+                                        (ch_id, frameCount, difCount))
+                    if satCount:
+                        messages.append("Ch [%s] Frame %d has %d saturations" %
+                                        (ch_id, frameCount, satCount))
+                _logger.warning("\n".join(messages))
+
+            if self._decode_scratch.size < frames_read * 20:
+                self._decode_scratch = empty([frames_read * 20], dtype=int32)
+            _decode_native_samples(frames['samples'], scale_factor,
+                                   _data_buf[frames_in_buf * 20:(frames_in_buf + frames_read) * 20],
+                                   self._decode_scratch)
+            frames_in_buf += frames_read
 
         return _data_buf
 
     def skip_frames(self, num_frames):
         bytes_to_skip = int(num_frames * 64)
-        # Python is dumb for seek and tell, it cannot tell us if a seek goes
-        # past EOF so instead we need to do inefficient reads to skip bytes
+        # A seek does not tell us if it went past EOF, so bound each seek
+        # by what is left in the current file
         while (bytes_to_skip > 0):
-            foo = self.stream.read(bytes_to_skip)
-            local_read_size = len(foo)
+            bytes_left = self.file_size - self.stream.tell()
+            local_skip_size = min(bytes_to_skip, bytes_left)
 
             # If we ran out of data in this file before finishing the skip,
             # open the next file and return false if there is no next file
             # to indicate that the skip ran out of
             # data before completion
-            if local_read_size == 0:
+            if local_skip_size <= 0:
                 more_data = self.open_next()
                 if not more_data:
                     return False
             else:
-                bytes_to_skip -= local_read_size
+                self.stream.seek(local_skip_size, os.SEEK_CUR)
+                bytes_to_skip -= local_skip_size
 
         # If we reached here we managed to skip all the data requested
         # return true
@@ -373,7 +485,8 @@ class DecimatedSegmentedReader(_TSReaderBase):
         # Init the base class
         _TSReaderBase.__init__(self, path, num_files, 128, report_hw_sat)
         self.unpack_header()
-        self.subheader = {}
+        self.subheader = _EMPTY_SEGMENT_SUBHEADER
+        self.__record_pool = {}  # Record arrays handed back through release_record_data, by size
 
     def unpack_header(self):   # TODO: Work in progress, for now unpacking as raw time series header
         if self.header_size == 128:
@@ -387,34 +500,62 @@ class DecimatedSegmentedReader(_TSReaderBase):
                 subheaderBytes = self.stream.read(32)
 
         if not subheaderBytes or len(subheaderBytes) < 32:
-            self.subheader['timestamp'] = 0
-            self.subheader['samplesInRecord'] = 0
+            self.subheader = self.subheader._replace(timestamp=0, samplesInRecord=0)
         else:
-            self.subheader['timestamp'] = unpack_from('I', subheaderBytes, 0)[0]
-            self.subheader['samplesInRecord'] = unpack_from('I', subheaderBytes, 4)[0]
-            self.subheader['satCount'] = unpack_from('H', subheaderBytes, 8)[0]
-            self.subheader['missCount'] = unpack_from('H', subheaderBytes, 10)[0]
-            self.subheader['minVal'] = unpack_from('f', subheaderBytes, 12)[0]
-            self.subheader['maxVal'] = unpack_from('f', subheaderBytes, 16)[0]
-            self.subheader['avgVal'] = unpack_from('f', subheaderBytes, 20)[0]
-
-    def read_record_data(self):
-        ret_array = empty([0])
-        if (self.stream is not None
-                and self.subheader['samplesInRecord'] is not None
-                and self.subheader['samplesInRecord'] != 0):
-            ret_array = fromfile(self.stream, dtype=float32, count=self.subheader['samplesInRecord'])
-            if ret_array.size == 0:
+            self.subheader = SegmentSubheader._make(_SEGMENT_SUBHEADER.unpack_from(subheaderBytes))
+
+    def read_record_data(self, copy=True):
+        """Read the samples of the record whose subheader was just read. With copy=False, a record
+        held whole by the current file is returned as a read-only view into its memory map"""
+        ret_array = empty([0], dtype=float32)
+        if self.stream is not None and self.subheader.samplesInRecord != 0:
+            if not copy:
+                view = self._view_samples(self.subheader.samplesInRecord, _DECIMATED_SAMPLE)
+                if view is not None:
+                    return view
+            ret_array = self.__new_record_array(self.subheader.samplesInRecord)
+            ret_bytes = memoryview(ret_array).cast('B')
+            bytes_read = self.stream.readinto(ret_bytes)
+            if bytes_read == 0:
                 if not self.open_next():
-                    return empty([0])
+                    return empty([0], dtype=float32)
                 # Array below will contain the data, or will be an empty array if end of series as desired
-                ret_array = fromfile(self.stream, dtype=float32, count=self.subheader['samplesInRecord'])
+                bytes_read = self.stream.readinto(ret_bytes)
+            if bytes_read < ret_bytes.nbytes:
+                ret_array = ret_array[:bytes_read // ret_array.itemsize]
 
         return ret_array
 
-    def read_record(self):
+    def __new_record_array(self, num_samples):
+        pooled = self.__record_pool.get(num_samples)
+        if pooled:
+            return pooled.pop()
+        return empty([num_samples], dtype=_DECIMATED_SAMPLE)
+
+    def release_record_data(self, record_data):
+        """Hand back an array returned by read_record_data (or read_record) that the caller no longer
+        uses, so that it gets reused for a later record instead of allocating a new one.
+        The array must not be used after releasing it"""
+        # Only whole records are pooled, partial records at the end of the series are views. Anything
+        # that is not a record array is ignored, as reading a record into it would desync the stream
+        if (record_data.base is None and record_data.flags.writeable and record_data.flags.c_contiguous
+                and record_data.dtype == _DECIMATED_SAMPLE):
+            pooled = self.__record_pool.setdefault(record_data.size, [])
+            if len(pooled) < 4 and not any(record_data is a for a in pooled):
+                pooled.append(record_data)
+
+    def read_record(self, copy=True):
         self.read_subheader()
-        return self.read_record_data()
+        return self.read_record_data(copy)
+
+    def iter_records(self):
+        """Generator over the rest of the records, yielding the subheader and the data of each one.
+        The data array is reused for a later record once the next one is requested; copy it to keep it"""
+        record_data = self.read_record()
+        while record_data.size != 0:
+            yield self.subheader, record_data
+            self.release_record_data(record_data)
+            record_data = self.read_record()
 
 class DecimatedContinuousReader(_TSReaderBase):
     """Class to create a streamer for continuous decimated time series,
@@ -430,16 +571,42 @@ class DecimatedContinuousReader(_TSReaderBase):
             super(DecimatedContinuousReader, self).unpack_header()
             # TODO: Implement any specific header unpacking for this particular class below
 
-    def read_data(self, numSamples):
-        ret_array = empty([0])
+    def read_data(self, numSamples, copy=True):
+        """Read the next numSamples samples of the series. With copy=False, samples held whole by
+        the current file are returned as a read-only view into its memory map"""
+        ret_array = empty([0], dtype=float32)
         if self.stream is not None:
-            ret_array = fromfile(self.stream, dtype=float32, count=numSamples)
-            while ret_array.size < numSamples:
-                if not self.open_next():
-                    return empty([0])
-                # Array below will contain the data, or will be an empty array if end of series as desired
-                ret_array = append(ret_array,
-                                   fromfile(self.stream,
-                                            dtype=float32,
-                                            count=(numSamples - ret_array.size)))
+            if not copy:
+                view = self._view_samples(numSamples, _DECIMATED_SAMPLE)
+                if view is not None:
+                    return view
+            ret_array = empty([numSamples], dtype=_DECIMATED_SAMPLE)
+            if not self.__read_into(ret_array):
+                # Array below will be an empty array, as desired at the end of the series
+                return empty([0], dtype=float32)
         return ret_array
+
+    def iter_data(self, numSamples):
+        """Generator over the rest of the series in blocks of numSamples samples.
+        Every block is yielded in the same array, which is only valid until the next block is
+        requested; copy it to keep it"""
+        if self.stream is not None:
+            block = empty([numSamples], dtype=_DECIMATED_SAMPLE)
+            while self.__read_into(block):
+                yield block
+
+    def __read_into(self, out):
+        # Read straight into the output array, continuing in the next file when this one ends.
+        # A short read that reaches the file size is the end of the file, so the next file is
+        # opened without probing the exhausted one with an empty read
+        out_bytes = memoryview(out).cast('B')
+        filled = 0
+        while filled < out_bytes.nbytes:
+            bytes_read = self.stream.readinto(out_bytes[filled:])
+            filled += bytes_read
+            if filled < out_bytes.nbytes and (bytes_read == 0 or self.stream.tell() >= self.file_size):
+                # Drop the partial sample a truncated file may end with, so the next file starts aligned
+                filled -= filled % out.itemsize
+                if not self.open_next():
+                    return False
+        return True